@@ -10,23 +10,122 @@ CLI example:
 
 Stdout:
   Prints one line TSV: k <TAB> theta <TAB> n <TAB> mean
+
+Per-group fits (all groups in one vectorized pass):
+  python3 scripts/50_gamma_mle.py --tsv data/lifespans.tsv --group-col brand \
+    --out out/gamma_by_brand.txt
+  prints one line per group: group <TAB> k <TAB> theta <TAB> n <TAB> mean
+  (k and theta are nan for groups with no usable or all-identical values)
+
+Side output:
+  The parsed column is cached next to the TSV as <tsv>.<col>.npy so that
+  60_plot_gamma.py can load it without parsing the TSV again.
 """
 
 import argparse
 import os
 import sys
 import numpy as np
-import pandas as pd
-from scipy.stats import gamma
 
+# pandas/scipy are imported inside the functions that use them, so `--help` and
+# argument errors return without paying their import time.
 
-def fit_gamma_loc0(x: np.ndarray):
+
+def _gamma_sufficient_stats(x: np.ndarray):
+    # sum(ln x), sum(x) and n over the positive finite entries, computed from one filtered copy
     x = np.asarray(x, dtype=float)
-    x = x[np.isfinite(x) & (x > 0)]
-    if x.size == 0:
+    v = x[np.isfinite(x) & (x > 0)]
+    return float(np.log(v).sum()), float(v.sum()), int(v.size)
+
+
+def _gamma_shape_mle(d, n_iter: int = 8):
+    # Solve ln(k) - digamma(k) = d for the Gamma shape k, elementwise over d.
+    # Entries with d <= 0 or nan (empty or all-identical groups) come back as nan.
+    from scipy.special import digamma, polygamma
+
+    d = np.asarray(d, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d = np.where(d > 0, d, np.nan)
+        # closed-form starting point (Minka), already close to the root
+        k = (3.0 - d + np.sqrt((d - 3.0) ** 2 + 24.0 * d)) / (12.0 * d)
+        active = np.isfinite(k)
+        for _ in range(n_iter):
+            if not active.any():
+                break
+            # the derivative is negative for every k > 0; for nearly identical values k is
+            # huge and it cancels to 0 in floating point. The starting point is already
+            # accurate there, so those entries stop instead of dividing by zero.
+            slope = 1.0 / k - polygamma(1, k)
+            step = (np.log(k) - digamma(k) - d) / slope
+            ok = active & (slope < 0) & np.isfinite(step)
+            k = np.where(ok, k - step, k)
+            active = ok & (np.abs(step) > 1e-12 * k)
+    return k
+
+
+def fit_gamma_loc0(x: np.ndarray, n_iter: int = 8):
+    s1, s2, n = _gamma_sufficient_stats(x)
+    if n == 0:
         raise SystemExit("No positive finite values to fit.")
-    k, loc, theta = gamma.fit(x, floc=0)
-    return float(k), float(theta), int(x.size), float(x.mean())
+    # With loc=0 the MLE for k solves  ln(k) - digamma(k) = ln(mean x) - mean(ln x) = d,
+    # and then theta = mean(x) / k. Only the two sums over x are needed.
+    s = s2 / n
+    t = s1 / n
+    d = np.log(s) - t
+    if not d > 0:
+        raise SystemExit("All values identical; Gamma shape is not identifiable.")
+    k = _gamma_shape_mle(d, n_iter)
+    k = float(k)
+    if not (np.isfinite(k) and k > 0):
+        raise SystemExit("Gamma shape did not converge; values are too close to identical.")
+    theta = s / k
+    return float(k), float(theta), n, float(s)
+
+
+def fit_gamma_loc0_groups(X: np.ndarray, n_iter: int = 8):
+    # One fit per row of a (groups, values) array padded with nan, all rows at once.
+    # Returns k, theta, n, mean arrays; k and theta are nan where a row cannot be fit.
+    X = np.asarray(X, dtype=float)
+    ok = np.isfinite(X) & (X > 0)
+    n = ok.sum(axis=1)
+    s1 = np.log(np.where(ok, X, 1.0)).sum(axis=1)
+    s2 = np.where(ok, X, 0.0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = s2 / n
+        d = np.log(s) - s1 / n
+    k = _gamma_shape_mle(d, n_iter)
+    theta = s / k
+    return k, theta, n, s
+
+
+def _pad_groups(x: np.ndarray, groups: np.ndarray):
+    # sorted group names and a (groups, max group size) array of x, padded with nan
+    names, inv = np.unique(groups, return_inverse=True)
+    order = np.argsort(inv, kind="stable")
+    counts = np.bincount(inv, minlength=names.size)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    pos = np.arange(order.size) - starts[inv[order]]
+    X = np.full((names.size, counts.max(initial=0)), np.nan)
+    X[inv[order], pos] = x[order]
+    return names, X
+
+
+def _column_cache_path(tsv_path: str, col: str) -> str:
+    # must match 60_plot_gamma.py
+    return f"{tsv_path}.{col}.npy"
+
+
+def _report_text(source: str, col: str, k: float, theta: float, n: int, mean_: float) -> str:
+    return (
+        "Gamma MLE (loc=0)\n"
+        "source      : " + source + "\n"
+        "column      : " + col + "\n"
+        "n           : " + str(n) + "\n"
+        "k (shape)   : " + f"{k:.6f}" + "\n"
+        "theta(scale): " + f"{theta:.6f}" + "\n"
+        "E[X]=k*theta: " + f"{k*theta:.6f} months" + "\n"
+        "sample mean : " + f"{mean_:.6f} months" + "\n"
+    )
 
 
 def write_report(
@@ -34,16 +133,17 @@ def write_report(
 ):
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
     with open(path, "w") as f:
-        f.write(
-            "Gamma MLE (loc=0)\n"
-            "source      : " + source + "\n"
-            "column      : " + col + "\n"
-            "n           : " + str(n) + "\n"
-            "k (shape)   : " + f"{k:.6f}" + "\n"
-            "theta(scale): " + f"{theta:.6f}" + "\n"
-            "E[X]=k*theta: " + f"{k*theta:.6f} months" + "\n"
-            "sample mean : " + f"{mean_:.6f} months" + "\n"
-        )
+        f.write(_report_text(source, col, k, theta, n, mean_))
+
+
+def write_group_report(path: str, source: str, col: str, group_col: str, names, k, theta, n, mean_):
+    # one report section per group, separated by a blank line
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write("\n".join(
+            group_col + " = " + str(g) + "\n" + _report_text(source, col, *vals)
+            for g, *vals in zip(names, k, theta, n, mean_)
+        ))
 
 
 def main():
@@ -51,19 +151,48 @@ def main():
     ap.add_argument("--tsv", default="data/lifespans.tsv")
     ap.add_argument("--out", default="out/gamma_fit.txt")
     ap.add_argument("--col", default="lifespan_months")
+    ap.add_argument("--group-col", default=None, help="Fit one Gamma per value of this column (e.g. brand)")
     args = ap.parse_args()
 
-    df = pd.read_csv(args.tsv, sep="\t")
+    import pandas as pd
+
+    # read the header first so only the fitted column is parsed
+    header = pd.read_csv(args.tsv, sep="\t", nrows=0).columns
     col = (
         args.col
-        if args.col in df.columns
+        if args.col in header
         else (
             "lifespan_months"
-            if "lifespan_months" in df.columns
-            else df.select_dtypes("number").columns[0]
+            if "lifespan_months" in header
+            else pd.read_csv(args.tsv, sep="\t").select_dtypes("number").columns[0]
         )
     )
-    x = pd.to_numeric(df[col], errors="coerce").to_numpy()
+    if args.group_col is not None and args.group_col not in header:
+        raise SystemExit(f"--group-col {args.group_col!r} not found in {args.tsv}.")
+    usecols = [col] if args.group_col is None else [col, args.group_col]
+    dtype = {col: "float64"} if args.group_col is None else {col: "float64", args.group_col: str}
+    try:
+        # known-numeric column: let the parser produce float64 directly
+        df = pd.read_csv(
+            args.tsv, sep="\t", usecols=usecols, dtype=dtype, na_values=["", "NA", "NaN"]
+        )
+        x = df[col].to_numpy(copy=False)
+    except ValueError:
+        # stray non-numeric cells: fall back to coercing them to NaN
+        df = pd.read_csv(args.tsv, sep="\t", usecols=usecols, dtype={c: t for c, t in dtype.items() if c != col})
+        x = pd.to_numeric(df[col], errors="coerce").to_numpy()
+    try:
+        np.save(_column_cache_path(args.tsv, col), x)
+    except OSError:
+        pass  # the cache is only a shortcut for the plot step
+
+    if args.group_col is not None:
+        names, X = _pad_groups(x, df[args.group_col].fillna("").to_numpy())
+        k, theta, n, mean_ = fit_gamma_loc0_groups(X)
+        write_group_report(args.out, args.tsv, col, args.group_col, names, k, theta, n, mean_)
+        for row in zip(names, k, theta, n, mean_):
+            print("\t".join(str(v) for v in row))
+        return
 
     k, theta, n, mean_ = fit_gamma_loc0(x)
     write_report(args.out, args.tsv, col, k, theta, n, mean_)
@@ -3,7 +3,7 @@
 AM215 - Plot helper for Gamma fits (loc=0).
 
 Generates two figures for a given dataset and fitted parameters:
-  1) Histogram (density=True) overlaid with Gamma(k, theta) PDF
+  1) Density histogram overlaid with Gamma(k, theta) PDF
   2) Log-likelihood contour in (k, theta) around the MLE
 
 CLI example:
@@ -22,39 +22,94 @@ Outputs:
 import argparse
 import os
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import gamma
-from scipy.special import gammaln
 
-def _load_values(tsv_path: str, col: str) -> np.ndarray:
-    df = pd.read_csv(tsv_path, sep="\t")
-    if col not in df.columns:
+# pandas/matplotlib/scipy are imported inside the functions that use them, so
+# `--help` and argument errors return without paying their import time.
+
+def _pyplot():
+    # figures only go to PNG files, so pick the non-GUI Agg backend before pyplot loads
+    # instead of letting matplotlib probe for Qt/Tk on a headless machine
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+def _column_cache_path(tsv_path: str, col: str) -> str:
+    # written by 50_gamma_mle.py; must match its naming
+    return f"{tsv_path}.{col}.npy"
+
+def _read_column(tsv_path: str, col: str) -> np.ndarray:
+    import pandas as pd
+
+    # read the header first so only the plotted column is parsed
+    header = pd.read_csv(tsv_path, sep="\t", nrows=0).columns
+    if col not in header:
+        df = pd.read_csv(tsv_path, sep="\t")
         num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
         if not num_cols:
             raise SystemExit("No numeric column found and --col not present.")
-        col = num_cols[0]
-    x = pd.to_numeric(df[col], errors="coerce").to_numpy()
+        return df[num_cols[0]].to_numpy(dtype=float)
+    try:
+        # known-numeric column: let the parser produce float64 directly
+        df = pd.read_csv(
+            tsv_path, sep="\t", usecols=[col], dtype={col: "float64"}, na_values=["", "NA", "NaN"]
+        )
+        return df[col].to_numpy(copy=False)
+    except ValueError:
+        # stray non-numeric cells: fall back to coercing them to NaN
+        df = pd.read_csv(tsv_path, sep="\t", usecols=[col])
+        return pd.to_numeric(df[col], errors="coerce").to_numpy()
+
+def _load_values(tsv_path: str, col: str) -> np.ndarray:
+    cache = _column_cache_path(tsv_path, col)
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(tsv_path):
+        # the fit step already parsed this column: memory-map it instead of re-reading the TSV
+        x = np.load(cache, mmap_mode="r")
+    else:
+        x = _read_column(tsv_path, col)
     x = x[np.isfinite(x) & (x > 0)]
     if x.size == 0:
         raise SystemExit("No positive finite values to plot.")
     return x
 
 def _loglike_gamma_loc0(x: np.ndarray, k: float, theta: float) -> float:
+    from scipy.special import gammaln
+
     # l(k,theta) = (k-1) sum ln x  - (sum x)/theta  - n*k*ln(theta)  - n*ln(Gamma(k))
+    # x is already filtered to positive finite values by _load_values
     n = x.size
-    s1 = np.sum(np.log(x))
-    s2 = np.sum(x)
+    s1 = np.log(x).sum()
+    s2 = x.sum()
     return (k - 1.0) * s1 - (s2 / theta) - n * k * np.log(theta) - n * gammaln(k)
 
+def _ll_grid(K, T, gK, lT, s1, s2, n):
+    # l(K,T) = (K-1)*s1 - s2/T - n*K*ln(T) - n*ln(Gamma(K)) on the (T, K) grid;
+    # rows index T and columns index K (the layout plt.contour expects).
+    # The K-only and T-only terms are folded into 1-D vectors first, and the grid is
+    # filled in place in one preallocated buffer: no full-size temporaries.
+    a = (K - 1.0) * s1 - n * gK
+    b = -s2 / T
+    ll = np.empty((T.size, K.size), dtype=np.result_type(K, T))
+    np.multiply.outer(lT, K, out=ll)
+    ll *= -n
+    ll += a[None, :]
+    ll += b[:, None]
+    return ll
+
 def plot_hist_with_pdf(x: np.ndarray, k: float, theta: float, out_png: str, title: str, bins: int = 40):
+    plt = _pyplot()
+    from scipy.special import gammaln, xlogy
+
     xs_max = max(np.percentile(x, 99.5), x.max())
-    grid = np.linspace(0.0, xs_max * 1.15, 400)
-    pdf = gamma.pdf(grid, a=k, loc=0.0, scale=theta)
+    grid = np.linspace(0.0, xs_max * 1.15, 200)
+    # Gamma(k, theta) pdf written out directly, same form as _loglike_gamma_loc0;
+    # xlogy keeps the x=0 endpoint right (0 for k>1, 1/theta for k=1, inf for k<1)
+    pdf = np.exp(xlogy(k - 1.0, grid) - grid / theta - k * np.log(theta) - gammaln(k))
+    counts, edges = np.histogram(x, bins=bins, range=(0.0, xs_max * 1.15), density=True)
 
     plt.figure()
-    plt.hist(x, bins=bins, density=True, alpha=0.65, edgecolor="none")
-    plt.plot(grid, pdf, linewidth=2.0)
+    plt.bar(edges[:-1], counts, width=np.diff(edges), align="edge", alpha=0.65, edgecolor="none")
+    plt.plot(grid, pdf, linewidth=2.0, color="C1")
     plt.xlabel("months")
     plt.ylabel("density")
     plt.title(title)
@@ -64,27 +119,32 @@ def plot_hist_with_pdf(x: np.ndarray, k: float, theta: float, out_png: str, titl
     plt.close()
 
 def plot_ll_contour(x: np.ndarray, k_mle: float, th_mle: float, out_png: str, title: str):
+    plt = _pyplot()
+    from scipy.special import gammaln
+
     # Build a grid centered near the MLE
     k_lo, k_hi = max(1e-3, k_mle * 0.25), k_mle * 4.0
     th_lo, th_hi = max(1e-6, th_mle * 0.25), th_mle * 4.0
 
-    K = np.linspace(k_lo, k_hi, 180)
-    T = np.linspace(th_lo, th_hi, 180)
-    KK, TT = np.meshgrid(K, T, indexing="xy")
+    # float32 is plenty for a 7-level contour plot and halves the grid's memory traffic;
+    # the sums themselves are still accumulated in float64
+    K = np.linspace(k_lo, k_hi, 180, dtype=np.float32)
+    T = np.linspace(th_lo, th_hi, 180, dtype=np.float32)
 
+    # x is already filtered to positive finite values by _load_values
     n = x.size
-    s1 = np.sum(np.log(x))
-    s2 = np.sum(x)
+    s1 = np.float32(np.log(x).sum())
+    s2 = np.float32(x.sum())
 
-    # l(K,T) = (K-1)*s1 - s2/T - n*K*ln(T) - n*ln(Gamma(K))
-    ll = (KK - 1.0) * s1 - (s2 / TT) - n * KK * np.log(TT) - n * gammaln(KK)
+    # separable in K and T: evaluate gammaln/log on the 1-D axes only
+    ll = _ll_grid(K, T, gammaln(K).astype(np.float32), np.log(T), s1, s2, n)
 
     ll_max = np.nanmax(ll)
     z = ll - ll_max  # peak at 0
     levels = [-9.21, -5.99, -3.00, -2.00, -1.00, -0.50, -0.10]
 
     plt.figure()
-    cs = plt.contour(K, T, z.T, levels=levels, linewidths=1.2)
+    cs = plt.contour(K, T, z, levels=levels, linewidths=1.2)
     plt.clabel(cs, inline=True, fontsize=8, fmt="dL=%.2f")
     plt.scatter([k_mle], [th_mle], s=40, marker="x")
     plt.xlabel("k (shape)")
@@ -17,14 +17,15 @@ Notes:
 """
 
 import os
-import csv
 import math
-import random
-from datetime import datetime, timedelta
 from typing import List, Tuple
 import numpy as np
+import pandas as pd
 import json
+import time
+import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 # --------------------------
 # Utilities
@@ -34,29 +35,36 @@ def months_to_days(m):
     # Use 30.44 days per month (365.24/12)
     return m * 30.44
 
-def add_months_as_days(start: datetime, months: float) -> datetime:
-    return start + timedelta(days=months_to_days(months))
+def add_months_as_days(start: np.ndarray, months: np.ndarray) -> np.ndarray:
+    # whole days only, like adding a fractional timedelta to midnight and keeping the date
+    return start + np.floor(months_to_days(months)).astype("timedelta64[D]")
 
-def rand_date_ymd(start_ymd: str, end_ymd: str, rng: random.Random) -> datetime:
-    start = datetime.strptime(start_ymd, "%Y-%m-%d")
-    end = datetime.strptime(end_ymd, "%Y-%m-%d")
-    span_days = (end - start).days
-    off = rng.randrange(span_days + 1)
-    return start + timedelta(days=off)
+ORDER_ID_CHARS = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
 
-def make_order_id(rng: random.Random) -> str:
-    return "O" + "".join(rng.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(9))
+def rand_dates_ymd(start_ymd: str, end_ymd: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    start = np.datetime64(start_ymd, "D")
+    end = np.datetime64(end_ymd, "D")
+    span_days = int((end - start) / np.timedelta64(1, "D"))
+    return start + rng.integers(0, span_days + 1, size=n).astype("timedelta64[D]")
 
-def pick_stars_failure(rng: random.Random) -> int:
+def format_ymd(days: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(days, unit="D")
+
+def make_order_ids(n: int, rng: np.random.Generator) -> np.ndarray:
+    # draw all n x 9 characters at once, then view each row of 9 chars as one string
+    chars = ORDER_ID_CHARS[rng.integers(0, ORDER_ID_CHARS.size, size=(n, 9))]
+    return np.char.add("O", chars.view("<U9").ravel())
+
+def pick_stars_failure(n: int, rng: np.random.Generator) -> np.ndarray:
     # Failures skew low
-    return rng.choices([1,2,3], weights=[0.6,0.3,0.1], k=1)[0]
+    return rng.choice([1,2,3], size=n, p=[0.6,0.3,0.1])
 
-def pick_stars_other(rng: random.Random) -> int:
+def pick_stars_other(n: int, rng: np.random.Generator) -> np.ndarray:
     # Non-failures are mixed
-    return rng.choices([3,4,5,2], weights=[0.2,0.4,0.35,0.05], k=1)[0]
+    return rng.choice([3,4,5,2], size=n, p=[0.2,0.4,0.35,0.05])
 
-def pick_verified(rng: random.Random) -> str:
-    return "true" if rng.random() < 0.85 else "false"
+def pick_verified(n: int, rng: np.random.Generator) -> np.ndarray:
+    return np.where(rng.random(n) < 0.85, "true", "false")
 
 # --------------------------
 # Text generation (LLM optional)
@@ -66,8 +74,8 @@ HF_MODEL = os.environ.get("TEXTGEN_MODEL", "google/gemma-2-2b-it")
 HF_URL = f"https://api-inference.huggingface.co/models/{HF_MODEL}"
 HF_TOKEN = os.environ.get("HF_API_TOKEN")
 
-def _hf_generate(prompt: str, max_new_tokens: int = 80) -> str:
-    """Minimal HF Inference call. Falls back to prompt if no token configured."""
+def _hf_generate(prompt: str, max_new_tokens: int = 80, retries: int = 4) -> str:
+    """Minimal HF Inference call. Returns "" if no token configured or the call fails."""
     if not HF_TOKEN:
         return ""
     payload = json.dumps({"inputs": prompt, "parameters": {"max_new_tokens": max_new_tokens}})
@@ -81,18 +89,32 @@ def _hf_generate(prompt: str, max_new_tokens: int = 80) -> str:
         },
         method="POST",
     )
-    try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-            # HF can return a list[{"generated_text": "..."}] or dict with "error"
-            if isinstance(data, list) and data and "generated_text" in data[0]:
-                return str(data[0]["generated_text"]).strip()
-            # Some text-generation endpoints return plain string
-            if isinstance(data, str):
-                return data.strip()
+    for attempt in range(retries + 1):
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                data = json.loads(resp.read().decode("utf-8"))
+                # HF can return a list[{"generated_text": "..."}] or dict with "error"
+                if isinstance(data, list) and data and "generated_text" in data[0]:
+                    return str(data[0]["generated_text"]).strip()
+                # Some text-generation endpoints return plain string
+                if isinstance(data, str):
+                    return data.strip()
+                return ""
+        except urllib.error.HTTPError as e:
+            # 503 means the model is still loading: back off and try again
+            if e.code != 503 or attempt == retries:
+                return ""
+            time.sleep(2 ** attempt)
+        except Exception:
             return ""
-    except Exception:
-        return ""
+    return ""
+
+def _hf_generate_batch(prompts: List[str], max_workers: int = 16) -> List[str]:
+    """Run _hf_generate over all prompts concurrently; results keep the prompt order."""
+    if not HF_TOKEN or not prompts:
+        return [""] * len(prompts)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_hf_generate, prompts))
 
 # ----- Prompts -----
 
@@ -146,36 +168,41 @@ OTHER_BODIES = [
     "Seems fine out of the box; will update later."
 ]
 
-def gen_failure_text(brand: str, months: float, rng: random.Random) -> Tuple[str, str]:
-    prompt = FAILURE_PROMPT_TEMPLATE.format(brand=brand, months=months)
-    text = _hf_generate(prompt) if HF_TOKEN else ""
-    t, b = parse_title_body(text)
-    if not t:
-        t = rng.choice(FAILURE_TITLES)
-    if not b:
-        b = rng.choice(FAILURE_BODIES).format(m=months)
-    return t, b
-
-def gen_other_text(brand: str, rng: random.Random) -> Tuple[str, str]:
-    prompt = OTHER_PROMPT_TEMPLATE.format(brand=brand)
-    text = _hf_generate(prompt) if HF_TOKEN else ""
-    t, b = parse_title_body(text)
-    if not t:
-        t = rng.choice(OTHER_TITLES)
-    if not b:
-        b = rng.choice(OTHER_BODIES)
-    return t, b
+def _parse_all(llm_texts: List[str]) -> List[Tuple[str, str]]:
+    return [parse_title_body(t) if t else ("", "") for t in llm_texts]
+
+def gen_failure_texts(months: np.ndarray, llm_texts: List[str], rng: np.random.Generator) -> Tuple[List[str], List[str]]:
+    # template indices for every row are drawn up front; they only fill in blanks left by the LLM
+    ti = rng.integers(0, len(FAILURE_TITLES), size=len(months))
+    bi = rng.integers(0, len(FAILURE_BODIES), size=len(months))
+    parsed = _parse_all(llm_texts)
+    titles = [t or FAILURE_TITLES[i] for (t, _), i in zip(parsed, ti)]
+    bodies = [b or FAILURE_BODIES[j].format(m=m) for (_, b), j, m in zip(parsed, bi, months)]
+    return titles, bodies
+
+def gen_other_texts(llm_texts: List[str], rng: np.random.Generator) -> Tuple[List[str], List[str]]:
+    ti = rng.integers(0, len(OTHER_TITLES), size=len(llm_texts))
+    bi = rng.integers(0, len(OTHER_BODIES), size=len(llm_texts))
+    parsed = _parse_all(llm_texts)
+    titles = [t or OTHER_TITLES[i] for (t, _), i in zip(parsed, ti)]
+    bodies = [b or OTHER_BODIES[j] for (_, b), j in zip(parsed, bi)]
+    return titles, bodies
 
 # --------------------------
 # Main generator
 # --------------------------
 
+TSV_COLUMNS = [
+    "review_id","brand","date_purchased","date_posted",
+    "review_title","review_body","stars","verified","order_id","expected_signed_months_token"
+]
+
 def sample_gamma_lifespans(k: float, theta: float, n: int, seed: int) -> np.ndarray:
     rng = np.random.default_rng(seed)
     # numpy uses shape=k, scale=theta for Gamma
     x = rng.gamma(shape=k, scale=theta, size=n)
-    # ensure strictly positive
-    x = np.maximum(x, np.finfo(float).eps)
+    # ensure strictly positive (in place: x is freshly allocated and ours)
+    np.clip(x, np.finfo(float).eps, None, out=x)
     return x
 
 def make_dataset(
@@ -208,91 +235,61 @@ def make_dataset(
       - date_posted = date_purchased + U[0.2, 18] months (harmless variation)
       - expected_signed_months_token = "" (empty)
     """
-    rng = random.Random(seed)
-    np.random.seed(seed)
+    rng_np = np.random.default_rng(seed)
 
-    rows = []
+    # Columns are built whole, in group order: failures Alpha, failures Beta,
+    # non-failures Alpha, non-failures Beta.
+    counts = [n_fail_alpha, n_fail_beta, n_other_alpha, n_other_beta]
+    n_fail = n_fail_alpha + n_fail_beta
+    n_total = sum(counts)
 
-    # Failures - Alpha
     lifespans_A = sample_gamma_lifespans(k_alpha, th_alpha, n_fail_alpha, seed=seed + 11)
-    for i, m in enumerate(lifespans_A, 1):
-        rid = f"rA{i:03d}"
-        brand = "Alpha"
-        dp = rand_date_ymd(purchase_start, purchase_end, rng)
-        dpost = add_months_as_days(dp, float(m))
-        # guard: if post goes beyond a reasonable window, still format as date
-        title, body = gen_failure_text(brand, float(m), rng)
-        stars = pick_stars_failure(rng)
-        verified = pick_verified(rng)
-        order_id = make_order_id(rng)
-        rows.append([
-            rid, brand, dp.strftime("%Y-%m-%d"), dpost.strftime("%Y-%m-%d"),
-            title, body, str(stars), verified, order_id, f"{float(m):.2f}"
-        ])
-
-    # Failures - Beta
     lifespans_B = sample_gamma_lifespans(k_beta, th_beta, n_fail_beta, seed=seed + 22)
-    for i, m in enumerate(lifespans_B, 1):
-        rid = f"rB{i:03d}"
-        brand = "Beta"
-        dp = rand_date_ymd(purchase_start, purchase_end, rng)
-        dpost = add_months_as_days(dp, float(m))
-        title, body = gen_failure_text(brand, float(m), rng)
-        stars = pick_stars_failure(rng)
-        verified = pick_verified(rng)
-        order_id = make_order_id(rng)
-        rows.append([
-            rid, brand, dp.strftime("%Y-%m-%d"), dpost.strftime("%Y-%m-%d"),
-            title, body, str(stars), verified, order_id, f"{float(m):.2f}"
-        ])
-
-    # Non-failures (distractors) - Alpha
-    for i in range(n_other_alpha):
-        rid = f"rAX{i+1:03d}"
-        brand = "Alpha"
-        dp = rand_date_ymd(purchase_start, purchase_end, rng)
-        # arbitrary benign elapsed time
-        m = rng.uniform(0.2, 18.0)
-        dpost = add_months_as_days(dp, m)
-        title, body = gen_other_text(brand, rng)
-        stars = pick_stars_other(rng)
-        verified = pick_verified(rng)
-        order_id = make_order_id(rng)
-        rows.append([
-            rid, brand, dp.strftime("%Y-%m-%d"), dpost.strftime("%Y-%m-%d"),
-            title, body, str(stars), verified, order_id, ""
-        ])
-
-    # Non-failures (distractors) - Beta
-    for i in range(n_other_beta):
-        rid = f"rBX{i+1:03d}"
-        brand = "Beta"
-        dp = rand_date_ymd(purchase_start, purchase_end, rng)
-        m = rng.uniform(0.2, 18.0)
-        dpost = add_months_as_days(dp, m)
-        title, body = gen_other_text(brand, rng)
-        stars = pick_stars_other(rng)
-        verified = pick_verified(rng)
-        order_id = make_order_id(rng)
-        rows.append([
-            rid, brand, dp.strftime("%Y-%m-%d"), dpost.strftime("%Y-%m-%d"),
-            title, body, str(stars), verified, order_id, ""
-        ])
-
-    # Shuffle so failures and non-failures are mixed
-    rng.shuffle(rows)
-
-    # Write TSV with header
+    fail_months = np.concatenate([lifespans_A, lifespans_B])
+    # arbitrary benign elapsed time for non-failures
+    months = np.concatenate([fail_months, rng_np.uniform(0.2, 18.0, size=n_total - n_fail)])
+
+    brand = np.repeat(["Alpha", "Beta", "Alpha", "Beta"], counts)
+    review_id = np.array(
+        [f"{p}{i:03d}" for p, c in zip(["rA", "rB", "rAX", "rBX"], counts) for i in range(1, c + 1)],
+        dtype=str,
+    )
+
+    dp_days = rand_dates_ymd(purchase_start, purchase_end, n_total, rng_np)
+    date_purchased = format_ymd(dp_days)
+    # guard: if post goes beyond a reasonable window, still format as date
+    date_posted = format_ymd(add_months_as_days(dp_days, months))
+    stars = np.concatenate([pick_stars_failure(n_fail, rng_np), pick_stars_other(n_total - n_fail, rng_np)])
+    verified = pick_verified(n_total, rng_np)
+    order_id = make_order_ids(n_total, rng_np)
+    token = np.concatenate([np.char.mod("%.2f", fail_months), np.full(n_total - n_fail, "")])
+
+    # Build every prompt up front and send them concurrently; results keep prompt order.
+    prompts = (
+        [FAILURE_PROMPT_TEMPLATE.format(brand=b, months=float(m)) for b, m in zip(brand[:n_fail], fail_months)]
+        + [OTHER_PROMPT_TEMPLATE.format(brand=b) for b in brand[n_fail:]]
+    )
+    texts = _hf_generate_batch(prompts)
+    fail_titles, fail_bodies = gen_failure_texts(fail_months, texts[:n_fail], rng_np)
+    other_titles, other_bodies = gen_other_texts(texts[n_fail:], rng_np)
+    title = np.array(fail_titles + other_titles, dtype=object)
+    body = np.array(fail_bodies + other_bodies, dtype=object)
+
+    columns = [
+        review_id, brand, date_purchased, date_posted,
+        title, body, stars, verified, order_id, token
+    ]
+
+    # Shuffle so failures and non-failures are mixed: one permutation applied to every column
+    perm = rng_np.permutation(n_total)
+    table = pd.DataFrame({name: col[perm] for name, col in zip(TSV_COLUMNS, columns)})
+
+    # Write TSV with header in one vectorized pass. csv.writer's "\r\n" line ending is
+    # kept on purpose: 10_clean.sh is there to strip those carriage returns.
     os.makedirs(os.path.dirname(out_tsv) or ".", exist_ok=True)
-    with open(out_tsv, "w", newline="") as f:
-        w = csv.writer(f, delimiter="\t")
-        w.writerow([
-            "review_id","brand","date_purchased","date_posted",
-            "review_title","review_body","stars","verified","order_id","expected_signed_months_token"
-        ])
-        w.writerows(rows)
-
-    print(f"[synth] wrote {out_tsv} ({len(rows)} rows)")
+    table.to_csv(out_tsv, sep="\t", index=False, lineterminator="\r\n")
+
+    print(f"[synth] wrote {out_tsv} ({n_total} rows)")
 
 # --------------------------
 # CLI